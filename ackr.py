@@ -29,24 +29,21 @@ associated with a pull request and
 TODO:
 
   - finish `interdiff` command
-  - `pull --all` with summary of updates
 
 """
 
-import datetime
+import atexit
+import bisect
+import functools
 import json
-import urllib.request
 import logging
-import pprint
 import typing as t
 import re
-import contextlib
+import shlex
 import sys
 import os
 import threading
-import textwrap
-import pipes
-import platform
+import time
 from typing import NamedTuple
 from pathlib import Path
 import subprocess
@@ -54,6 +51,14 @@ from subprocess import run
 
 from clii import App
 
+if t.TYPE_CHECKING:
+    import http.client
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
 
 if sys.version_info < (3, 11):
     print("Needs Python version >= 3.11", file=sys.stderr)
@@ -62,28 +67,32 @@ if sys.version_info < (3, 11):
 
 cli = App(description=__doc__)
 cli.add_arg("--verbose", "-v", action="store_true", default=False)
+cli.add_arg(
+    "--fetch-all", action="store_true", default=False,
+    help="fetch every remote before pulling; normally only what's needed is "
+    "fetched from upstream",
+)
+
+
+_HOME = Path.home()
 
+ACKR_CONF_PATH = _HOME / ".config" / "ackr"
 
-ACKR_CONF_PATH = Path.home() / ".config" / "ackr"
+try:
+    _CONF: dict = json.loads(ACKR_CONF_PATH.read_text())
+except FileNotFoundError:
+    _CONF = {}
 
 
 def get_conf(key: str, envkey: str, default: t.Any):
     """
     Return a configuration value first from the environment, then from config file.
     """
-    if getattr(get_conf, "__cached_conf", None) is None:
-        readconf = {}
-        if ACKR_CONF_PATH.exists():
-            readconf = json.loads(ACKR_CONF_PATH.read_text())
-        setattr(get_conf, '__cached_conf', readconf)
-
-    conffile: dict = getattr(get_conf, '__cached_conf')
-
-    return os.path.expanduser(os.environ.get(envkey, conffile.get(key, default)))
+    return os.path.expanduser(os.environ.get(envkey, _CONF.get(key, default)))
 
 
 # Where ackr state will be stored.
-ACKR_DIR = Path(get_conf("storage_dir", "ACKR_DIR", Path.home() / ".ackr"))
+ACKR_DIR = Path(get_conf("storage_dir", "ACKR_DIR", _HOME / ".ackr"))
 
 # Used to generate references to tags for your PRs.
 ACKR_GH_USER = get_conf("ghuser", "ACKR_GH_USER", "jamesob")
@@ -96,15 +105,28 @@ UPSTREAM = get_conf("upstream_remote_name", "ACKR_UPSTREAM", "upstream")
 
 PAGER = get_conf("pager", "PAGER", "less")
 
+# A Github API token, for a higher rate limit. Only a token configured for
+# ackr itself, rather than a GITHUB_TOKEN exported for other tools, also
+# switches PR metadata over to the GraphQL API (which trims pr.json).
+_ACKR_GH_TOKEN = get_conf("github_token", "ACKR_GH_TOKEN", "")
+ACKR_GH_TOKEN = _ACKR_GH_TOKEN or os.environ.get("GITHUB_TOKEN", "")
+
 # Symlinks to tags are stored ordered here by date for convenient reference.
 BY_DATE_DIR = ACKR_DIR / "by-date"
 
+# Github API responses are cached here along with their ETag so that repeat
+# requests for unchanged data can be answered with a 304.
+HTTP_CACHE_DIR = ACKR_DIR / ".http_cache"
+
 log = logging.getLogger(__name__)
 logging.basicConfig()
 
 # Toggled below with the `-v` flag.
 DEBUG = False
 
+# Toggled below with the `--fetch-all` flag.
+FETCH_ALL = False
+
 
 # 8 bit Color
 ###############################################################################
@@ -131,9 +153,13 @@ def conn_line(msg: str) -> str:
     return green(bold(" ○  ")) + msg
 
 
+# Checked once rather than on every colored string.
+_IS_TTY = sys.stdout.isatty()
+
+
 def make_color(start, end: str) -> t.Callable[[str], str]:
     def color_func(s: str) -> str:
-        if not sys.stdout.isatty():
+        if not _IS_TTY:
             return s
 
         # render
@@ -182,12 +208,22 @@ class OutputStreamer(threading.Thread):
             return f"    {red(line)}"
 
     def run(self):
+        # Flushing in batches rather than per line keeps long output (e.g. a
+        # big fetch) from costing a write per line.
+        unflushed = 0
         for line in iter(self.pipe_reader.readline, ""):
             if not self.quiet:
-                print(self.render_line(line.rstrip("\n")))
+                text = line[:-1] if line.endswith("\n") else line
+                sys.stdout.write(self.render_line(text) + "\n")
+                unflushed += 1
+                if unflushed >= 64:
+                    sys.stdout.flush()
+                    unflushed = 0
             if self.capture:
                 self.lines.append(line)
 
+        if unflushed:
+            sys.stdout.flush()
         self.pipe_reader.close()
 
     def close(self):
@@ -199,46 +235,516 @@ def _ensure_location():
         raise die("must be running within the bitcoin git repo")
 
 
-def _github_api(path: str) -> dict:
-    url = f"https://api.github.com{path}"
-    resp = urllib.request.urlopen(url)
-    return json.loads(resp.read().decode())
+def _json_loads(raw: bytes) -> t.Any:
+    """Parse JSON straight from bytes, with orjson if it's installed."""
+    if orjson:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _load_json(path: Path, default: t.Any = None) -> t.Any:
+    """Parse a JSON file, or return `default` if it's missing or malformed."""
+    try:
+        return _json_loads(path.read_bytes())
+    except (FileNotFoundError, ValueError):
+        return default
+
+
+def _json_dumps(obj: t.Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes, with orjson if it's installed."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def _write_json(path: Path, obj: t.Any):
+    """
+    Atomically write indented JSON to a file without building it as a str
+    first.
+    """
+    if orjson:
+        _atomic_write_bytes(path, orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
+
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, "w") as f:
+            json.dump(obj, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+# Kept open across calls so that requests after the first skip the TCP and TLS
+# handshakes; created on first use by _github_request(). _pull calls the API
+# from worker threads, so the connection is only used under _GH_LOCK.
+_GH_CONN: t.Optional["http.client.HTTPConnection"] = None
+_GH_LOCK = threading.Lock()
+
+
+def _github_connection() -> "http.client.HTTPConnection":
+    """Connect to api.github.com, through an HTTPS proxy if one is configured."""
+    import http.client
+    import urllib.parse
+    import urllib.request
+
+    # The same HTTPS_PROXY/NO_PROXY handling that urllib.request.urlopen does.
+    proxy = urllib.request.getproxies().get("https")
+    if not proxy or urllib.request.proxy_bypass("api.github.com"):
+        return http.client.HTTPSConnection("api.github.com", timeout=10)
+
+    u = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    if not u.hostname:
+        die(f"couldn't parse the HTTPS proxy setting {proxy!r}")
+
+    tunnel_headers = {}
+    if u.username:
+        import base64
+
+        user = urllib.parse.unquote(u.username)
+        password = urllib.parse.unquote(u.password or "")
+        tunnel_headers["Proxy-Authorization"] = (
+            "Basic " + base64.b64encode(f"{user}:{password}".encode()).decode())
+
+    conn = http.client.HTTPSConnection(u.hostname, u.port or 80, timeout=10)
+    conn.set_tunnel("api.github.com", 443, headers=tunnel_headers)
+    return conn
+
+
+def _github_request(
+    method: str, path: str, headers: dict, body: t.Optional[bytes] = None
+) -> tuple["http.client.HTTPResponse", bytes]:
+    """Make a request to api.github.com, returning the response and its body."""
+    with _GH_LOCK:
+        return _github_request_locked(method, path, headers, body)
+
+
+def _github_request_locked(
+    method: str, path: str, headers: dict, body: t.Optional[bytes]
+) -> tuple["http.client.HTTPResponse", bytes]:
+    import gzip
+    import http.client
+    import urllib.parse
+
+    global _GH_CONN
+    if _GH_CONN is None:
+        _GH_CONN = _github_connection()
+
+    headers = {"Accept-Encoding": "gzip", "User-Agent": "ackr", **headers}
+    if ACKR_GH_TOKEN:
+        # Authenticated requests get 5000/hr rather than 60/hr.
+        headers["Authorization"] = f"bearer {ACKR_GH_TOKEN}"
+
+    def send() -> tuple["http.client.HTTPResponse", bytes]:
+        assert _GH_CONN
+        req_path = path
+        # Github answers for renamed or transferred repos with a redirect.
+        for _ in range(5):
+            _GH_CONN.request(method, req_path, body=body, headers=headers)
+            resp = _GH_CONN.getresponse()
+            raw = resp.read()
+            if resp.status not in (301, 302, 307, 308):
+                break
+            loc = urllib.parse.urlsplit(resp.headers.get("Location", ""))
+            if loc.netloc not in ("", "api.github.com"):
+                die(f"Github API request for {path} redirected to {loc.geturl()}")
+            req_path = loc.path + (f"?{loc.query}" if loc.query else "")
+            if DEBUG:
+                print(f"[api] {path} redirected to {req_path}")
+
+        if resp.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        return resp, raw
+
+    def send_reconnecting() -> tuple["http.client.HTTPResponse", bytes]:
+        assert _GH_CONN
+        try:
+            return send()
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # Github closed the idle connection; closing ours makes the retry
+            # reconnect.
+            _GH_CONN.close()
+            return send()
+
+    resp, raw = send_reconnecting()
+
+    # Github's frontends fail like this now and then; it's worth a few quick
+    # retries before giving up.
+    for attempt in range(3):
+        if resp.status not in (502, 503, 504):
+            break
+        time.sleep(0.5 * 2 ** attempt)
+        resp, raw = send_reconnecting()
+
+    if resp.status in (403, 429) and resp.headers.get("X-RateLimit-Remaining") == "0":
+        wait = max(int(resp.headers.get("X-RateLimit-Reset", 0)) - time.time(), 0) + 1
+        print(
+            red("Github API rate limit exceeded") + f"; waiting {int(wait)}s for it "
+            "to reset (set ACKR_GH_TOKEN for a higher limit)",
+            file=sys.stderr,
+        )
+        time.sleep(wait)
+        resp, raw = send_reconnecting()
+
+    return resp, raw
+
+
+def _github_api(path: str, use_cache: bool = True, max_age: float = 60) -> dict:
+    """
+    GET a Github API path, making the request conditional on any cached copy.
+
+    Unchanged data comes back as a bodyless 304, in which case the cached
+    body is returned. A cached copy confirmed within the last `max_age`
+    seconds is returned without asking at all. With `use_cache=False` the
+    request is unconditional, though its response still refreshes the cache.
+    """
+    import hashlib
+
+    cache_path = HTTP_CACHE_DIR / (hashlib.sha1(path.encode()).hexdigest() + ".json")
+    cached: dict = _load_json(cache_path, {}) if use_cache else {}
+    if cached:
+        # The cache file's mtime is when Github last vouched for it.
+        if time.time() - cache_path.stat().st_mtime < max_age:
+            if DEBUG:
+                print(f"[api] {path} checked recently; using cached response")
+            return cached["body"]
+
+    headers = {"Accept": "application/vnd.github+json"}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    resp, raw = _github_request("GET", path, headers)
+
+    if resp.status == 304 and cached:
+        if DEBUG:
+            print(f"[api] {path} not modified; using cached response")
+        os.utime(cache_path)
+        return cached["body"]
+    elif resp.status != 200:
+        die(f"Github API request for {path} failed: {resp.status} {resp.reason}")
+
+    body = _json_loads(raw)
+    HTTP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Atomically, so an interrupted write can't leave a truncated entry that
+    # would fail to parse on the next run.
+    _atomic_write_bytes(cache_path, _json_dumps({
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "body": body,
+    }))
+    return body
+
+
+def _github_graphql(query: str, variables: dict) -> dict:
+    """Run a query against Github's GraphQL API, which requires a token."""
+    resp, raw = _github_request(
+        "POST",
+        "/graphql",
+        {"Content-Type": "application/json"},
+        body=_json_dumps({"query": query, "variables": variables}),
+    )
+    if resp.status != 200:
+        die(f"Github GraphQL request failed: {resp.status} {resp.reason}")
+
+    out = _json_loads(raw)
+
+    if out.get("errors"):
+        die(f"Github GraphQL query failed: {out['errors'][0].get('message')}")
+
+    return out["data"]
+
+
+# Only the fields that ackr uses.
+_PR_FIELDS = "number title state author { login __typename }"
+
+_PR_QUERY = """
+query($num: Int!) {
+  repository(owner: "bitcoin", name: "bitcoin") {
+    pullRequest(number: $num) { %s }
+  }
+}
+""" % _PR_FIELDS
+
+# How many PRs _get_prs_json() asks for per GraphQL query; comfortably within
+# the limits Github puts on a single query.
+_GRAPHQL_BATCH_SIZE = 50
+
+
+def _rest_shaped_pr(pr: dict) -> dict:
+    """Project a GraphQL pullRequest onto the REST API's pull request object."""
+    return {
+        "number": pr["number"],
+        "title": pr["title"],
+        # REST has no "merged" state; merged PRs are just closed.
+        "state": "open" if pr["state"] == "OPEN" else "closed",
+        "user": {"login": _rest_login(pr["author"])},
+    }
+
+
+def _rest_login(author: t.Optional[dict]) -> str:
+    # Deleted accounts have no author; REST calls them "ghost".
+    if not author:
+        return "ghost"
+    # REST names apps' bot accounts e.g. "dependabot[bot]"; GraphQL leaves off
+    # the suffix.
+    if author.get("__typename") == "Bot":
+        return author["login"] + "[bot]"
+    return author["login"]
+
+
+def _get_pr_json(prnum: int, full: bool = False, use_cache: bool = True) -> dict:
+    """
+    Return a PR's metadata in the shape of the REST API's pull request object.
+
+    With a token configured for ackr (not just GITHUB_TOKEN), only the fields
+    ackr needs are fetched, via GraphQL. Otherwise, or given `full`, the
+    entire REST object is returned.
+    """
+    if full or not _ACKR_GH_TOKEN:
+        return _github_api(f"/repos/bitcoin/bitcoin/pulls/{prnum}", use_cache)
+
+    pr = _github_graphql(_PR_QUERY, {"num": prnum})["repository"]["pullRequest"]
+    return _rest_shaped_pr(pr)
+
+
+def _get_prs_json(
+    prnums: t.Sequence[int], full: bool = False, use_cache: bool = True
+) -> dict[int, dict]:
+    """
+    _get_pr_json() for many PRs, keyed by PR number.
+
+    With an ackr token (and without `full`), the PRs are fetched in batches of
+    _GRAPHQL_BATCH_SIZE per GraphQL query rather than a request apiece.
+    """
+    if full or not _ACKR_GH_TOKEN:
+        return {n: _get_pr_json(n, full=full, use_cache=use_cache) for n in prnums}
+
+    out = {}
+    for i in range(0, len(prnums), _GRAPHQL_BATCH_SIZE):
+        batch = prnums[i:i + _GRAPHQL_BATCH_SIZE]
+        # Each PR gets its own alias within a single repository lookup.
+        fields = "\n".join(
+            f"    pr{n}: pullRequest(number: {n}) {{ {_PR_FIELDS} }}" for n in batch)
+        query = (
+            '{\n  repository(owner: "bitcoin", name: "bitcoin") {\n'
+            f"{fields}\n  }}\n}}"
+        )
+        repo = _github_graphql(query, {})["repository"]
+        for n in batch:
+            out[n] = _rest_shaped_pr(repo[f"pr{n}"])
+
+    return out
 
 
-def _fetch_upstream(prnum: int):
-    _sh(
-        f"git fetch {UPSTREAM} master "
-        f"+refs/pull/{prnum}/head:refs/{UPSTREAM}/pr/{prnum}",
-        check=True,
+def _fetch_upstream(*prnums: int):
+    """Fetch upstream's master and the heads of the given PRs in one go."""
+    # Remote refs to fetch, and the local refs they're fetched into.
+    refs = {"refs/heads/master": f"refs/remotes/{UPSTREAM}/master"}
+    for prnum in prnums:
+        refs[f"refs/pull/{prnum}/head"] = f"refs/{UPSTREAM}/pr/{prnum}"
+
+    # `ls-remote` is a single small round-trip; only fetch (and negotiate a
+    # pack for) the refs that have moved.
+    remote_shas = dict(
+        line.split()[::-1] for line in
+        _git("ls-remote", UPSTREAM, *refs.keys()).splitlines()
+    )
+    local_shas = dict(
+        line.split()[::-1] for line in _git(
+            "for-each-ref", "--format=%(objectname) %(refname)", *refs.values()
+        ).splitlines()
     )
+    moved = [
+        f"+{remote}:{local}" for remote, local in refs.items()
+        if not remote_shas.get(remote) or remote_shas[remote] != local_shas.get(local)
+    ]
+    if not moved:
+        if DEBUG:
+            print(f"{UPSTREAM} master and PR(s) {prnums} unchanged; skipping fetch")
+        return
+
+    _sh(["git", "fetch", UPSTREAM, *moved], check=True)
+    _clear_git_caches()
 
 
-def _sh(cmd: str, check: bool = False, quiet: bool = False) -> str:
-    """Run a command and return its stdout."""
+def _sh(argv: list[str], check: bool = False, quiet: bool = False) -> str:
+    """Run a command, without a shell, and return its stdout."""
     if DEBUG:
-        print(f"[cmd] {cmd}", flush=True)
+        print(f"[cmd] {shlex.join(argv)}", flush=True)
+
+    if quiet:
+        # Nothing is shown, so there's no need for a streaming thread.
+        try:
+            result = run(
+                argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        except FileNotFoundError:
+            result = subprocess.CompletedProcess(argv, 127, "")
+
+        if result.returncode != 0 and check:
+            die(f"command failed: {shlex.join(argv)}")
 
-    output = OutputStreamer(quiet=quiet, capture=True)
+        return result.stdout.strip()
+
+    output = OutputStreamer(capture=True)
     kwargs: dict[str, t.Any] = {}
     kwargs["stdout"] = output
     kwargs["stderr"] = output
-    kwargs["shell"] = True
 
-    with subprocess.Popen(cmd, **kwargs) as s:
+    try:
+        with subprocess.Popen(argv, **kwargs) as s:
+            output.close()
+            output.join()
+            returncode = s.wait()
+    except FileNotFoundError:
+        # Without a shell there's nobody to report "command not found".
         output.close()
         output.join()
-        returncode = s.wait()
+        returncode = 127
 
-        if returncode != 0 and check:
-            die(f"command failed: {cmd}")
+    if returncode != 0 and check:
+        die(f"command failed: {shlex.join(argv)}")
 
     return "".join(output.lines).strip()
 
 
-def _sh_check(cmd: str) -> bool:
-    """Return True if the command completes successfully."""
-    out = run(cmd, shell=True, capture_output=True)
-    return out.returncode == 0
+def _git(*args: str, check: bool = False) -> str:
+    """Run git directly, without a shell or output streaming, and return its stdout."""
+    if DEBUG:
+        print(f"[cmd] git {' '.join(args)}", flush=True)
+
+    out = run(["git", *args], capture_output=True, text=True)
+    if out.returncode != 0 and check:
+        die(f"command failed: git {' '.join(args)}\n{out.stderr.strip()}")
+
+    return out.stdout.strip()
+
+
+@functools.lru_cache(maxsize=None)
+def _git_cached(*args: str) -> str:
+    """
+    _git() for read-only queries that get asked more than once per run.
+
+    Anything that moves refs or adds revisions must call _clear_git_caches().
+    """
+    return _git(*args)
+
+
+def _clear_git_caches():
+    _git_cached.cache_clear()
+    _get_ordered_rev_dirs_cached.cache_clear()
+
+
+class GitRepo:
+    """
+    Resolves revisions through a long-lived `git cat-file --batch-check`, so
+    each lookup is a line over a pipe rather than another git process.
+    """
+
+    def __init__(self):
+        self._batch_check: t.Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def resolve(self, rev: str) -> t.Optional[str]:
+        """Return the object name for any revision git understands, or None."""
+        if DEBUG:
+            print(f"[cmd] git cat-file --batch-check <<< {rev}", flush=True)
+
+        with self._lock:
+            if self._batch_check is None:
+                self._batch_check = subprocess.Popen(
+                    ["git", "cat-file", "--batch-check=%(objectname)"],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                )
+                atexit.register(self.close)
+
+            assert self._batch_check.stdin and self._batch_check.stdout
+            self._batch_check.stdin.write(rev + "\n")
+            self._batch_check.stdin.flush()
+            out = self._batch_check.stdout.readline().strip()
+
+        # Revisions that can't be resolved come back as "<rev> missing".
+        return None if (not out or " " in out) else out
+
+    def close(self):
+        if self._batch_check:
+            self._batch_check.communicate()
+            self._batch_check = None
+
+
+_GIT_REPO = GitRepo()
+
+
+def _atomic_write_bytes(path: Path, data: bytes):
+    """
+    Replace a file's contents such that readers see either the old or the new
+    data, never a partial write.
+    """
+    tmp = _tmp_path(path)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _tmp_path(path: Path) -> Path:
+    # A dotfile, so that a leftover from a crash isn't committed to the
+    # state repo.
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def _write_if_changed(path: Path, data: bytes):
+    """Write data to a file, unless the file already holds exactly that."""
+    try:
+        if path.read_bytes() == data:
+            return
+    except FileNotFoundError:
+        pass
+
+    _atomic_write_bytes(path, data)
+
+
+def _sh_to_file(cmd: list[str], path: Path):
+    """
+    Run a command with its stdout going straight to a file, which only appears
+    once the command has succeeded.
+    """
+    if DEBUG:
+        print(f"[cmd] {shlex.join(cmd)} > {path}", flush=True)
+
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, "wb") as f:
+            result = run(cmd, stdout=f, stderr=subprocess.PIPE, text=True)
+
+        if result.returncode != 0:
+            die(f"command failed: {shlex.join(cmd)}\n{result.stderr.rstrip()}")
+
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+# Translates everything but ASCII alphanumerics to "_" for PR path names.
+_HR_ID_TRANS = str.maketrans({c: "_" for c in range(128) if not chr(c).isalnum()})
+
+
+# Revision directories are named <seq>.<short sha>.
+_REV_DIR_RE = re.compile(r"\d+\.")
+
+
+def _list_revisions(pr_dir: t.Union[str, Path]) -> list[tuple[int, str, Path]]:
+    """Return (seq, name, path) for each revision directory of a PR."""
+    with os.scandir(pr_dir) as entries:
+        return [
+            (int(e.name.split(".", 1)[0]), e.name, Path(e.path))
+            for e in entries if _REV_DIR_RE.match(e.name)
+        ]
 
 
 class PRData(NamedTuple):
@@ -253,13 +759,18 @@ class PRData(NamedTuple):
     @classmethod
     def from_json_dict(cls, d: dict) -> "PRData":
         author = d["user"]["login"]
-        hr_id = re.sub(r"[^a-zA-Z0-9]+", "_", d["title"].lower())[:24].strip("_")
+        # Non-ASCII characters are replaced with "?" so the table covers them.
+        hr_id = d["title"].lower().encode("ascii", "replace").decode()
+        hr_id = hr_id.translate(_HR_ID_TRANS)
+        while "__" in hr_id:
+            hr_id = hr_id.replace("__", "_")
+        hr_id = hr_id[:24].strip("_")
         path = (ACKR_DIR / "{}.{}.{}".format(d["number"], author, hr_id))
 
         # hr_id may change as authors rename PRs, so reuse that path/hr_id if that's
         # happened.
-        if (existing := list(ACKR_DIR.glob(f'{d["number"]}.{author}.*'))):
-            path = existing[0]
+        if (existing := _pr_dirs_prefixed(f'{d["number"]}.{author}.')):
+            path = ACKR_DIR / existing[0]
             hr_id = path.name.split('.')[-1]
 
         return cls(
@@ -272,19 +783,41 @@ class PRData(NamedTuple):
 
     def existing_tips(self) -> t.Mapping[str, int]:
         """Return the tips we've already seen from this PR."""
+        manifest = self.ackr_path / ".tips.json"
+        recorded = self._read_tips_manifest()
+
+        heads = {}
         sha_to_seq = {}
+        complete = True
+
+        for seq, name, path in _list_revisions(self.ackr_path):
+            if name in recorded:
+                heads[name] = recorded[name]
+            else:
+                try:
+                    heads[name] = (path / "HEAD").read_text().strip()
+                except Exception:
+                    print("!!! unable to read tipsha for {}".format(path))
+                    complete = False
+                    continue
+            sha_to_seq[heads[name]] = seq
+
+        # Don't record a revision directory that's still being populated.
+        if complete and heads != recorded:
+            _write_if_changed(manifest, _json_dumps(heads))
 
-        for path in self.ackr_path.glob("[0-9]*.*"):
-            seq = path.name.split(".")[0]
-            try:
-                tipsha = (path / "HEAD").read_text()
-            except Exception:
-                print("!!! unable to read tipsha for {}".format(path))
-                continue
+        return sha_to_seq
 
-            sha_to_seq[tipsha] = int(seq)
+    def _read_tips_manifest(self) -> dict[str, str]:
+        # .tips.json maps revision directory names to the HEAD they hold, so
+        # that only revisions added since it was written need their HEAD read.
+        return _load_json(self.ackr_path / ".tips.json", {})
 
-        return sha_to_seq
+    def record_tip(self, rev_dir: Path, tipsha: str):
+        """Note a newly written revision directory in .tips.json."""
+        recorded = self._read_tips_manifest()
+        recorded[rev_dir.name] = tipsha
+        _write_if_changed(self.ackr_path / ".tips.json", _json_dumps(recorded))
 
 
 class TipData(NamedTuple):
@@ -298,29 +831,24 @@ class TipData(NamedTuple):
     ackr_path: Path
 
     @classmethod
-    def from_prdata(cls, prdata: PRData):
+    def from_prdata(cls, prdata: PRData, existing_tips: t.Mapping[str, int]):
         ref = "{}/pr/{}".format(UPSTREAM, prdata.num)
-        tip_sha = _sh("git rev-parse {}".format(ref), quiet=True)
-        gotlog = _sh(
-            "git log --no-color {}/master..{} --oneline".format(UPSTREAM, ref),
-            check=True,
-            quiet=True,
-        )
-        earliest_commit_sha = gotlog.splitlines()[-1].split()[0]
-        base_sha = _sh("git rev-parse {}~1".format(earliest_commit_sha), quiet=True)
-        if len(base_sha) > 40:
-            raise die(f"base_sha is fucked: {base_sha[:100]}")
+        tip_sha = _GIT_REPO.resolve(f"{ref}^{{commit}}")
+        if not tip_sha:
+            die(f"couldn't find {ref}; has it been fetched?")
+        # Where the branch forked from master, without listing its commits.
+        base_sha = _git("merge-base", f"{UPSTREAM}/master", tip_sha, check=True)
+        if base_sha == tip_sha:
+            die(f"{ref} has no commits that aren't on {UPSTREAM}/master")
 
-        shortsha = tip_sha[:7]
-        preexisting_paths = list(prdata.ackr_path.glob("[0-9]*.*"))
         if DEBUG:
-            print("Preexisting PR paths: {}".format(preexisting_paths))
-
-        seq = len(preexisting_paths)
-        already_exists = any(str(p).endswith(shortsha) for p in preexisting_paths)
+            print("Preexisting PR tips: {}".format(existing_tips))
 
-        if not already_exists:
-            seq += 1
+        # A tip we've already seen keeps its revision number; a new one comes
+        # after the latest revision directory, counting any that were left
+        # half-written and so aren't among existing_tips.
+        seq = existing_tips.get(tip_sha) or max(
+            (seq for seq, _, _ in _list_revisions(prdata.ackr_path)), default=0) + 1
 
         ackr_path = prdata.ackr_path / "{}.{}".format(seq, tip_sha[:7])
 
@@ -337,93 +865,231 @@ class TipData(NamedTuple):
 
 def _commit_ackr_state(commit_msg: str) -> bool:
     """If the ackr data directory is a git repo, push it up to its remote."""
-    with contextlib.chdir(ACKR_DIR):
-        # If .ackr dir isn't a git repo, return early.
-        if not _sh_check("git status"):
-            return False
+    # If .ackr dir isn't a git repo, return early. (`git status` would tell
+    # us too, but only after walking the whole working tree.)
+    if not (ACKR_DIR / ".git").exists():
+        return False
+
+    # Dotfiles (e.g. .tips.json manifests) and everything under dot-directories
+    # (e.g. the HTTP cache) are local caches that don't belong in the shared
+    # state.
+    added = run(
+        ["git", "add", "-A", "--", ".",
+         ":(exclude,glob)**/.*", ":(exclude,glob)**/.*/**"],
+        cwd=ACKR_DIR)
+    committed = added.returncode == 0 and run(
+        ["git", "commit", "-a", "-m", commit_msg], cwd=ACKR_DIR).returncode == 0
+    if not committed:
+        print("!! failed to commit to ackr data git repo")
+        return False
+
+    print(
+        f"Pushing ackr state commit '{green(commit_msg)}'..."
+    )
+    pushed = run(["git", "push", "origin", "master"], cwd=ACKR_DIR)
+    if pushed.returncode != 0:
+        print("!! failed to push to ackr data git repo")
+        return False
 
-        committed = run(f"git add * && git commit -am '{commit_msg}'", shell=True)
-        if committed.returncode != 0:
-            print("!! failed to commit to ackr data git repo")
-            return False
+    return True
 
-        print(
-            f"Pushing ackr state commit '{green(commit_msg)}'..."
-        )
-        pushed = run("git push origin master", shell=True)
-        if pushed.returncode != 0:
-            print("!! failed to push to ackr data git repo")
-            return False
 
-        return True
+def _pull_ackr_state() -> bool:
+    """If the ackr data directory is a git repo, pull from its remote."""
+    # This passes cwd rather than chdir()ing so that it's safe to run on a
+    # thread while the bitcoin repo is being fetched.
+    #
+    # If .ackr dir isn't a git repo, return early.
+    if not (ACKR_DIR / ".git").exists():
+        return False
 
+    committed = run(["git", "pull", "origin", "master"], cwd=ACKR_DIR)
+    if committed.returncode != 0:
+        print("!! failed to pull ackr data git repo")
+        return False
 
-def _pull_ackr_state() -> bool:
-    """If the ackr data directory is a git repo, push it up to its remote."""
-    with contextlib.chdir(ACKR_DIR):
-        # If .ackr dir isn't a git repo, return early.
-        if not _sh_check("git status"):
-            return False
+    return True
 
-        committed = run("git pull origin master", shell=True)
-        if committed.returncode != 0:
-            print("!! failed to pull ackr data git repo")
-            return False
 
-        return True
+def _fetch_all():
+    """
+    With --fetch-all, fetch every remote.
+
+    Otherwise this does nothing: _fetch_upstream() fetches the refs that
+    pulling actually uses.
+    """
+    if not FETCH_ALL:
+        return
+    _sh(["git", "fetch", "--all", "--jobs=8", "--no-tags"], check=True)
+    _clear_git_caches()
 
 @cli.cmd
-def pull(prnum: int):
+@cli.arg("all_prs", "--all")
+def pull(
+    *prnums: int, full: bool = False, no_cache: bool = False, all_prs: bool = False
+):
     """
     Given a PR number, retrieve the code from Github and do a few things:
 
     - create a corresponding ackr/ tag for the tip,
     - generate a diff relative to the base of the branch and save it,
     - generate a review checklist with all commits.
+
+    Without a PR number, the current PR is pulled. Given several (or --all),
+    each is pulled and the ones with new revisions are summarized, but
+    nothing is checked out.
+
+    Args:
+        full: save the whole REST API PR object, even with ACKR_GH_TOKEN set
+        no_cache: don't make the Github API request conditional on a cached copy
+        all_prs: pull every open PR that has an ackr state dir
     """
-    _pull_ackr_state()
-    _sh("git fetch --all", check=True)
-    prnum = prnum or int(_get_current_pr_num())
-    (tip, changed) = _pull(prnum)
+    import concurrent.futures
+
+    if all_prs:
+        prnums = tuple(_list_reviewed_prs())
+        if not prnums:
+            die(f"no PRs found in {ACKR_DIR}")
+
+    # The ackr state repo and the bitcoin repo are unrelated, so update both
+    # at once.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        state_pulled = pool.submit(_pull_ackr_state)
+        _fetch_all()
+        try:
+            state_pulled.result()
+        except Exception as e:
+            print(f"!! failed to pull ackr data git repo: {e}")
+
+    if all_prs or len(prnums) > 1:
+        _pull_many(
+            prnums, full=full, use_cache=not no_cache, only_open=all_prs)
+        return
+
+    prnum = prnums[0] if prnums else int(_get_current_pr_num())
+    (tip, changed) = _pull(prnum, full=full, use_cache=not no_cache)
 
     if changed:
         print(f"Got new tip: {green(tip.ackr_tag)}")
         print()
-        print((tip.ackr_path / "review-checklist.md").read_text())
+        print((tip.ackr_path / "review-checklist.md").read_text().rstrip())
         print()
-        _sh(f"git checkout {tip.ackr_tag}")
+        _checkout(tip.ackr_tag)
         _commit_ackr_state(f'Started review: {_get_current_tag()}')
     else:
         print("PR up to date ({})".format(tip.tip_sha[:8]))
 
 
-def _pull(prnum: int) -> tuple[TipData, bool]:
-    """If a new tag was pulled, return the corresponding tipdata."""
-    prnum = prnum or int(_get_current_pr_num())
-    _fetch_upstream(prnum)
-    pr = PRData.from_json_dict(
-        _github_api("/repos/bitcoin/bitcoin/pulls/" + str(prnum))
+def _list_reviewed_prs() -> list[int]:
+    """Return the numbers of the PRs that have a state dir in ACKR_DIR."""
+    return sorted(
+        int(num) for name in _list_pr_dirs()
+        if (num := name.split(".", 1)[0]).isdigit()
     )
-    pr.ackr_path.mkdir(exist_ok=True)
-    tip = TipData.from_prdata(pr)
 
-    def create_tag():
-        if not _sh("git tag | grep {}".format(tip.ackr_tag), quiet=True).strip():
-            _sh("git tag {} {}".format(tip.ackr_tag, tip.tip_sha), quiet=True)
-            print(
-                f"Pushing new tag " f"{green(tip.ackr_tag)} ({green(tip.tip_sha)})..."
-            )
-            _sh("git push --no-verify --tags")
+
+def _pull_many(
+    prnums: t.Sequence[int],
+    full: bool = False,
+    use_cache: bool = True,
+    only_open: bool = False,
+):
+    """Pull several PRs, then summarize which of them have new revisions."""
+    prs_json = _get_prs_json(prnums, full=full, use_cache=use_cache)
+    if only_open:
+        prnums = [n for n in prnums if prs_json[n].get("state") == "open"]
+
+    # One ls-remote and at most one fetch for the lot, rather than a round of
+    # each per PR.
+    _fetch_upstream(*prnums)
+    new_tips = []
+
+    for prnum in prnums:
+        (tip, changed) = _pull(prnum, pr_json=prs_json[prnum], fetch=False)
+        if changed:
+            new_tips.append(tip)
+
+    print()
+    if not new_tips:
+        print("All PRs up to date")
+        return
+
+    print("Got new tips:")
+    for tip in new_tips:
+        print(f"  {green(tip.ackr_tag)}")
+    _commit_ackr_state(f"Pulled new revisions of {len(new_tips)} PR(s)")
+
+
+def _pull(
+    prnum: int,
+    full: bool = False,
+    use_cache: bool = True,
+    pr_json: t.Optional[dict] = None,
+    fetch: bool = True,
+) -> tuple[TipData, bool]:
+    """
+    If a new tag was pulled, return the corresponding tipdata.
+
+    `pr_json` is the PR's metadata if the caller has already fetched it, and
+    `fetch=False` means the caller has already fetched the PR's head too.
+    """
+    import concurrent.futures
+
+    # Callers may hand over the str from _get_current_pr_num(); GraphQL wants
+    # an Int.
+    prnum = int(prnum or _get_current_pr_num())
+
+    # Neither of these depends on the other, and both are network-bound.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        fetched = pool.submit(_fetch_upstream, prnum) if fetch else None
+        if pr_json is None:
+            pr_json = _get_pr_json(prnum, full=full, use_cache=use_cache)
+        if fetched:
+            fetched.result()
+
+    pr = PRData.from_json_dict(pr_json)
+
+    if pr.ackr_path.name not in _list_pr_dirs():
+        pr.ackr_path.mkdir(exist_ok=True)
+        _list_pr_dirs.cache_clear()
+    existing_tips = pr.existing_tips()
+    tip = TipData.from_prdata(pr, existing_tips)
+
+    def create_tag() -> bool:
+        """Create the tag unless it exists, returning whether it needs pushing."""
+        if _GIT_REPO.resolve(f"refs/tags/{tip.ackr_tag}"):
+            return False
+        # The empty old value makes this fail rather than clobber a tag
+        # created in the meantime.
+        _git("update-ref", f"refs/tags/{tip.ackr_tag}", tip.tip_sha, "",
+             check=True)
+        _clear_git_caches()
+        print(f"Pushing new tag {green(tip.ackr_tag)} ({green(tip.tip_sha)})...")
+        return True
+
+    def push_tag() -> str:
+        # Only the new tag; --tags would have git weigh every local tag. The
+        # output is captured so that it can't interleave with anything else
+        # running alongside.
+        out = _sh(
+            ["git", "push", "--no-verify", "origin", f"refs/tags/{tip.ackr_tag}"],
+            quiet=True,
+        )
+        return "\n".join(f"    {line}" for line in out.splitlines())
 
     if DEBUG:
         print("Latest tip is {}".format(tip.tip_sha))
-        print("Existing tips found: {}".format(pr.existing_tips()))
+        print("Existing tips found: {}".format(existing_tips))
 
-    if tip.tip_sha in pr.existing_tips():
-        create_tag()
+    if tip.tip_sha in existing_tips:
+        if create_tag() and (out := push_tag()):
+            print(out)
         return (tip, False)
 
+    import datetime
+
     tip.ackr_path.mkdir()
+    _clear_git_caches()
     by_date_name = (
         datetime.date.today().strftime("%Y-%m-%d")
         + "."
@@ -432,22 +1098,46 @@ def _pull(prnum: int) -> tuple[TipData, bool]:
     )
     ln_loc = BY_DATE_DIR / by_date_name
 
-    # Create a symlink to populate the by-date directory.
-    _sh(f"ln -rs {tip.ackr_path} {ln_loc}")
-
-    create_tag()
-    (tip.ackr_path / "pr.json").write_text(json.dumps(pr.json_data, indent=2))
-    (tip.ackr_path / "HEAD").write_text(tip.tip_sha)
-    (tip.ackr_path / "base.diff").write_text(
-        _sh("GIT_PAGER=cat git diff --no-color {} {}".format(
-            tip.base_sha, tip.tip_sha), quiet=True)
-    )
-    checklist = _sh(
-        "git log --no-color --format=oneline --abbrev-commit --no-merges {} "
-        "^upstream/master | tac | sed -e 's/^/- [ ] /g'".format(tip.tip_sha),
-        quiet=True,
-    )
-    (tip.ackr_path / "review-checklist.md").write_text(checklist)
+    # Create a symlink to populate the by-date directory. It can already exist
+    # if this revision was removed and pulled again on the same day; like
+    # `ln` did, leave it be. Both ends are resolved, as `ln -r` did, so that a
+    # symlinked by-date directory still gets a working link.
+    try:
+        ln_loc.symlink_to(
+            os.path.relpath(tip.ackr_path.resolve(), BY_DATE_DIR.resolve()))
+    except FileExistsError:
+        pass
+
+    # None of these depend on each other: the tag push waits on the network
+    # and the rest on git or the filesystem, so let them overlap.
+    needs_push = create_tag()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        pushed = pool.submit(push_tag) if needs_push else None
+        jobs = [
+            pool.submit(_write_json, tip.ackr_path / "pr.json", pr.json_data),
+            pool.submit(
+                _sh_to_file,
+                ["git", "diff", "--no-color", tip.base_sha, tip.tip_sha],
+                tip.ackr_path / "base.diff",
+            ),
+            # Oldest commit first; git writes the checklist markup itself.
+            pool.submit(
+                _sh_to_file,
+                ["git", "log", "--reverse", "--no-color", "--format=- [ ] %h %s",
+                 "--no-merges", tip.tip_sha, f"^{UPSTREAM}/master"],
+                tip.ackr_path / "review-checklist.md",
+            ),
+        ]
+        for job in jobs:
+            job.result()
+        if pushed and (out := pushed.result()):
+            print(out)
+
+    # HEAD is what marks a revision as pulled (see existing_tips()), so it's
+    # only written once everything else has made it to disk. The revision
+    # directory is new, so there's nothing to compare to.
+    _atomic_write_bytes(tip.ackr_path / "HEAD", tip.tip_sha.encode())
+    pr.record_tip(tip.ackr_path, tip.tip_sha)
 
     # Create an interdiff file if we have a previous revision to compare to.
     revs = _get_ordered_rev_dirs(str(prnum))
@@ -462,6 +1152,8 @@ def _pull(prnum: int) -> tuple[TipData, bool]:
 @cli.cmd
 def print_pr_data(prnum: int):
     """Print the Github API data associated with a PR."""
+    import pprint
+
     pprint.pprint(_github_api("/repos/bitcoin/bitcoin/pulls/" + str(prnum)))
 
 
@@ -483,7 +1175,7 @@ def print_tag_update(tag: str, one: str, two: str, verbose: bool = False):
 ```sh
 $ git range-diff master {tag}.{one} {tag}.{two}
 
-{_sh(f'git range-diff master {tag}.{one} {tag}.{two}', quiet=True)}
+{_sh(["git", "range-diff", "master", f"{tag}.{one}", f"{tag}.{two}"], quiet=True)}
 ```
 
 </details>
@@ -502,7 +1194,7 @@ def review():
     tag = _get_current_tag()
 
     checklist_path = rev_dir / "review-checklist.md"
-    run(f"{EDITOR} {checklist_path}", shell=True)
+    run([*shlex.split(EDITOR), str(checklist_path)])
     print(checklist_path)
     _commit_ackr_state(f'Review progress on {tag}')
 
@@ -510,30 +1202,26 @@ def review():
 def get_branch_commits(branch: str):
     """List branch commits, latest first."""
     branch = branch.split('~', 1)[0]  # nip off foobar~n
-    lines = _sh(
-        "git log --color=never --oneline "
-        f"$(git merge-base {UPSTREAM}/master {branch})..{branch}",
-        quiet=True,
-    )
+    base = _git_cached("merge-base", f"{UPSTREAM}/master", branch)
+    lines = _git_cached("log", "--color=never", "--oneline", f"{base}..{branch}")
     return [i.split()[0] for i in lines.splitlines()]
 
 
 @cli.cmd
 def ls():
-    out = _sh("git tag | grep '^ackr/'", quiet=True)
-    print(out)
+    print("\n".join(_list_ackr_tags("ackr/")))
 
 
 @cli.cmd
 def to(pr_num: str):
-    _sh("git fetch --all", check=True)
+    _fetch_all()
     _pull(int(pr_num))
     tags = _get_versions(pr_num)
 
     if not tags:
         die(f"no tags found for {pr_num}")
 
-    _sh(f"git checkout {tags[0]}")
+    _checkout(tags[0])
 
 
 @cli.cmd
@@ -543,7 +1231,7 @@ def start():
 
     If no prnum given, use the current tag.
     """
-    prnum = _get_current_pr_num()
+    prnum = int(_get_current_pr_num())
     (tip, changed) = _pull(prnum)
 
     if changed:
@@ -554,11 +1242,11 @@ def start():
 
     if marker.exists() and (commit := marker.read_text()):
         assert commit in commits
-        _sh(f'git checkout {commit}')
+        _checkout(commit)
         return
 
     marker.write_text(commits[-1])
-    _sh(f'git checkout {commits[-1]}')
+    _checkout(commits[-1])
 
 
 def _curr_commit_marker():
@@ -588,7 +1276,7 @@ def next(move: int = 1):
     except IndexError:
         die(f"index out of range for {commits} (idx: {idx}, move: {move})")
 
-    _sh(f'git checkout {to_commit}')
+    _checkout(to_commit)
     marker.write_text(to_commit)
 
 
@@ -624,9 +1312,9 @@ def rangediff():
     prev_tag = earlier_versions[0]
 
     input(f"Comparing {curr_tag} to {prev_tag} [enter] ")
-    cmd = f"git range-diff {UPSTREAM}/master {prev_tag} {curr_tag}"
-    print(cmd)
-    run(cmd, shell=True)
+    cmd = ["git", "range-diff", f"{UPSTREAM}/master", prev_tag, curr_tag]
+    print(shlex.join(cmd))
+    run(cmd)
 
 
 @cli.cmd
@@ -649,15 +1337,21 @@ def _get_interdiff(prev_rev: Path, rev: Path) -> str:
     return out.stdout
 
 
+def _list_ackr_tags(prefix: str) -> list[str]:
+    """List tags starting with `prefix`, letting git do the filtering."""
+    return _git_cached(
+        "for-each-ref", "--format=%(refname:short)", f"refs/tags/{prefix}*"
+    ).splitlines()
+
+
 def _get_versions(pr_num=""):
     """Get ordered tags, latest first."""
     if pr_num:
         prefix = f"ackr/{pr_num}"
     else:
-        curr_tag = _get_current_ackr_tag()
-        prefix = curr_tag.split(".")[0]
+        prefix = f"ackr/{_get_current_pr_num()}"
 
-    all_tags = _sh(f'git tag | grep "^{prefix}\."', quiet=True).splitlines()
+    all_tags = _list_ackr_tags(f"{prefix}.")
     return sorted(all_tags, reverse=True)
 
 
@@ -668,6 +1362,23 @@ def tags():
         print(v)
 
 
+# Commands that copy their stdin to the clipboard, in order of preference.
+_CLIPBOARD_CMDS = (
+    ["wl-copy"],
+    ["xclip", "-in", "-selection", "clipboard"],
+)
+
+
+def _clipboard_cmd() -> t.Optional[list[str]]:
+    """Return the first available clipboard command, with its full path."""
+    import shutil
+
+    for cmd in _CLIPBOARD_CMDS:
+        if path := shutil.which(cmd[0]):
+            return [path, *cmd[1:]]
+    return None
+
+
 @cli.cmd
 def ack(msg_file: str = ""):
     """
@@ -676,8 +1387,12 @@ def ack(msg_file: str = ""):
     Args:
         msg_file:
     """
+    # Only needed here, so not worth importing for every other command.
+    import platform
+    import textwrap
+
     _pull_ackr_state()
-    head_sha = _sh("git rev-parse HEAD", quiet=True, check=True)
+    head_sha = _git("rev-parse", "HEAD", check=True)
     msg = ""
     ackr_dir = _get_current_rev_dir()
     msg_path = Path(ackr_dir) / "ack_message.txt"
@@ -696,7 +1411,7 @@ def ack(msg_file: str = ""):
         if not msg_path.is_file():
             msg_path.write_text(header_txt)
         editor = os.environ.get("EDITOR", "nvim")
-        run(f"{editor} {msg_path}", shell=True, check=True)
+        run([*shlex.split(editor), str(msg_path)], check=True)
         msg = msg_path.read_text()
     elif Path(msg_file).is_file():
         msg = Path(msg_file).read_text()
@@ -709,14 +1424,18 @@ def ack(msg_file: str = ""):
     msg_path.write_text(msg)
     print(f"Wrote ACK message to {msg_path}")
 
-    signing_key = _sh("git config user.signingkey", quiet=True)
+    signing_key = _git("config", "user.signingkey")
 
     if not signing_key:
         die("you need to configure git's user.signingkey")
 
     signed = True
     try:
-        _sh(f"gpg -u {signing_key} -o {signed_path} --clearsign {msg_path}", check=True)
+        _sh(
+            ["gpg", "-u", signing_key, "-o", str(signed_path), "--clearsign",
+             str(msg_path)],
+            check=True,
+        )
     except Exception:
         print(f"GPG signing with key {signing_key} failed!", file=sys.stderr)
         signed = False
@@ -761,27 +1480,35 @@ Compiler version: {compiler_v}
     print(out)
     print("-" * 80)
 
-    if _sh("which wl-copy", quiet=True):
-        t = pipes.Template()
-        t.append("wl-copy", "--")
-        f = t.open("pipefile", "w")
-        f.write(out)
-        f.close()
+    if copier := _clipboard_cmd():
+        copied = run(copier, input=out, text=True, check=False)
 
-        print()
-        print("Signed ACK message copied to clipboard")
+        if copied.returncode == 0:
+            print()
+            print("Signed ACK message copied to clipboard")
 
     print(f"\nRunning git push origin {tag}")
-    _sh(f"git push --no-verify origin {tag}")
+    _sh(["git", "push", "--no-verify", "origin", tag])
     _commit_ackr_state(f"ACK: {_get_current_tag()}")
 
 
+# HEAD only moves when ackr checks something out, so the lookups that
+# depend on it are cached until _checkout() clears them.
+@functools.cache
 def _get_current_ackr_tag() -> str:
     """Get the ackr tag currently associated with the repo's HEAD."""
-    tags = _sh(
-        "git name-rev --tags --name-only $(git rev-parse HEAD)", quiet=True
-    ).split()
-    ackr_tags = [t for t in tags if "ackr/" in t]
+    # Usually HEAD is exactly a tag, which git can look up without walking
+    # history.
+    if tags := _git(
+        "for-each-ref", "--points-at", "HEAD", "--format=%(refname:short)",
+        "refs/tags/ackr/",
+    ).splitlines():
+        return tags[0]
+
+    # Otherwise we're somewhere within a branch (e.g. via `next`), so name HEAD
+    # relative to the nearest tag, e.g. ackr/28008.1.sipa.bip324_ciphersuite~2.
+    tags = _git("name-rev", "--tags", "--name-only", "HEAD").split()
+    ackr_tags = [t for t in tags if t.startswith("ackr/")]
 
     if not ackr_tags:
         die("HEAD not recognized by ackr (tags: {})".format(tags))
@@ -790,43 +1517,121 @@ def _get_current_ackr_tag() -> str:
     return ackr_tags[0]
 
 
+# ackr/<PR number>.<seq>.<author>.<hr_id>, possibly followed by a name-rev
+# suffix like ~2.
+_ACKR_TAG_RE = re.compile(
+    r"ackr/(?P<num>\d+)\.(?P<seq>\d+)\.(?P<author>[^.]+)\.(?P<hr_id>[^~^]*)")
+
+
+def _parse_ackr_tag(tag: str) -> re.Match[str]:
+    """Match an ackr tag, dying if it isn't one."""
+    if not (m := _ACKR_TAG_RE.match(tag)):
+        die(f"malformed ackr tag: {tag}")
+    return m
+
+
+@functools.cache
 def _get_current_pr_num() -> str:
-    tag = _get_current_ackr_tag().split("ackr/")[-1]
-    num, *_ = tag.split(".")
-    return num
+    return _parse_ackr_tag(_get_current_ackr_tag())["num"]
 
 
+@functools.cache
 def _get_current_tag() -> str:
     """E.g. 28008.1.sipa.bip324_ciphersuite"""
-    return _get_current_ackr_tag().split("ackr/")[-1]
+    return _get_current_ackr_tag().removeprefix("ackr/")
 
 
-def _get_current_tag_data() -> t.List[str]:
-    return _get_current_tag().split(".")
+def _checkout(rev: str):
+    """Check out `rev`, forgetting anything cached about the old HEAD."""
+    _sh(["git", "checkout", rev])
+    for f in (
+        _get_current_ackr_tag, _get_current_pr_num, _get_current_tag,
+        _get_current_rev_dir,
+    ):
+        f.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _list_pr_dirs() -> tuple[str, ...]:
+    """
+    Return the sorted names of the PR state dirs in ACKR_DIR.
+
+    This is read once per run; _pull clears it when it adds a PR dir.
+    """
+    with os.scandir(ACKR_DIR) as entries:
+        return tuple(sorted(
+            e.name for e in entries
+            if e.name[0].isdigit() and e.is_dir(follow_symlinks=False)
+        ))
+
+
+def _pr_dirs_prefixed(prefix: str) -> list[str]:
+    """Return the names from _list_pr_dirs() that start with `prefix`."""
+    names = _list_pr_dirs()
+    i = bisect.bisect_left(names, prefix)
+    out = []
+    while i < len(names) and names[i].startswith(prefix):
+        out.append(names[i])
+        i += 1
+    return out
 
 
+def _get_pr_dir(num: str) -> str:
+    """Return the ackr state dir for a PR number."""
+    [name] = _pr_dirs_prefixed(f"{num}.")
+    return os.path.join(ACKR_DIR, name)
+
+
+@functools.cache
 def _get_current_rev_dir() -> Path:
     """Get the ackr state dir associated with the current revision."""
-    num, i, *_ = _get_current_tag_data()
-    [pr_dir] = [n for n in ACKR_DIR.iterdir() if n.name.startswith("{}.".format(num))]
-    [rev_dir] = [n for n in pr_dir.iterdir() if n.name.startswith("{}.".format(i))]
+    tag = _parse_ackr_tag(_get_current_ackr_tag())
+    num, i = tag["num"], tag["seq"]
+    pr_dir = _get_pr_dir(num)
+    [rev_dir] = [path for seq, _, path in _list_revisions(pr_dir) if seq == int(i)]
 
     return rev_dir
 
 
 def _get_ordered_rev_dirs(num: t.Optional[str] = None) -> list[Path]:
     """Get the ackr state dir associated with the current revision."""
-    num = num or _get_current_pr_num()
-    [pr_dir] = [n for n in ACKR_DIR.iterdir() if n.name.startswith("{}.".format(num))]
-    return list(sorted(
-        [i for i in pr_dir.iterdir() if re.match(r'\d+\.', i.name)],
-        reverse=True, key=str))
+    return list(_get_ordered_rev_dirs_cached(num or _get_current_pr_num()))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_ordered_rev_dirs_cached(num: str) -> tuple[Path, ...]:
+    revs = sorted(_list_revisions(_get_pr_dir(num)), reverse=True)
+    return tuple(path for _, _, path in revs)
+
+
+# Matches the config.log lines that _parse_configure_log() cares about. The
+# alternatives are tried in order, so a line is classified by the first one
+# that matches.
+_CONFIG_LOG_RE = re.compile(
+    r"^(?:"
+    r"(?P<configure_command>  \$.*configure .*)"
+    r"|(?P<clang_version>.*clang version.*)"
+    r"|(?P<gcc_version>g\+\+ .*)"
+    r"|(?P<cxx>CXX=.*)"
+    r"|(?P<cxxflags>CXXFLAGS=.*)"
+    r"|(?P<extra_cxxflags>.*_CXXFLAGS=.*)"
+    r")$"
+)
+
+# autoconf dumps confdefs.h after the output variables; nothing past this
+# header is of interest.
+_CONFIG_LOG_END = "## confdefs.h. ##"
 
 
 def _parse_configure_log() -> dict:
     """
     Inspect the config.log file from the bitcoin src dir.
     """
+    configlog = Path("./config.log")
+    if not configlog.is_file():
+        print("No config.log found at %s", configlog, file=sys.stderr)
+        return {}
+
     out = {
         "configure_command": "",
         "clang_version": "",
@@ -834,41 +1639,42 @@ def _parse_configure_log() -> dict:
         "cxx": "",
         "cxxflags": "",
     }
-    configlog = Path("./config.log")
-    if not configlog.is_file():
-        print("No config.log found at %s", configlog, file=sys.stderr)
-        return {}
-
-    lines = configlog.read_text().splitlines()
 
     def extract_val(line) -> str:
         return line.split("=", 1)[-1].replace("'", "")
 
-    for line in lines:
-        if line.startswith("  $") and "configure " in line:
-            out["configure_command"] = line.strip("  $")
+    with open(configlog) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line == _CONFIG_LOG_END:
+                break
 
-        elif "clang version" in line:
-            out["clang_version"] = line
+            m = _CONFIG_LOG_RE.match(line)
+            if not m:
+                continue
+            field = m.lastgroup
+
+            if field == "configure_command":
+                out["configure_command"] = line.strip("  $")
 
-        elif line.startswith("g++ "):
-            out["gcc_version"] = line
+            elif field in ("clang_version", "gcc_version"):
+                out[field] = line
 
-        elif line.startswith("CXX="):
-            out["cxx"] = extract_val(line)
+            elif field == "cxx":
+                out["cxx"] = extract_val(line)
 
-        elif line.startswith("CXXFLAGS="):
-            out["cxxflags"] += extract_val(line)
+            elif field == "cxxflags":
+                out["cxxflags"] += extract_val(line)
 
-        elif "_CXXFLAGS=" in line:
-            val = extract_val(line)
-            if val:
-                out["cxxflags"] += val + " "
+            elif field == "extra_cxxflags":
+                val = extract_val(line)
+                if val:
+                    out["cxxflags"] += val + " "
 
     return out
 
 
-def die(msg: str):
+def die(msg: str) -> t.NoReturn:
     print(red(bold(msg)), file=sys.stderr)
     sys.exit(1)
 
@@ -880,7 +1686,12 @@ def check_remotes():
 
     conf = confpath.read_text()
 
-    if f'[remote "{UPSTREAM}"]' not in conf:
+    # The common case is answered by the text alone. Only if that misses do we
+    # ask git, which also sees remotes set up through includes or differently
+    # formatted sections.
+    if f'[remote "{UPSTREAM}"]' not in conf and not _git(
+        "config", "--get", f"remote.{UPSTREAM}.url"
+    ):
         die(
             "Missing upstream remote; run "
             f"`git remote add {UPSTREAM} https://github.com/bitcoin/bitcoin.git"
@@ -889,9 +1700,12 @@ def check_remotes():
 
 def main():
     _ensure_location()
-    cli.parse_for_run()
-    global DEBUG
+    # Parse once and dispatch to the subcommand's function ourselves;
+    # cli.run() would parse the arguments all over again.
+    (cmd, (cmd_args, cmd_kwargs)) = cli.parse_for_run()
+    global DEBUG, FETCH_ALL
     DEBUG = cli.args.verbose
+    FETCH_ALL = cli.args.fetch_all
 
     if not ACKR_DIR.exists():
         print("Created state directory at {}".format(ACKR_DIR))
@@ -902,7 +1716,7 @@ def main():
         BY_DATE_DIR.mkdir()
 
     check_remotes()
-    cli.run()
+    cmd(*cmd_args, **cmd_kwargs)
 
 
 if __name__ == "__main__":